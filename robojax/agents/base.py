@@ -5,7 +5,6 @@ from typing import Any, Callable, Tuple
 import flax
 import jax
 import jax.numpy as jnp
-import numpy as np
 from chex import PRNGKey
 from gymnasium.wrappers.record_video import RecordVideo
 
@@ -155,10 +154,13 @@ class BasePolicy:
             del eval_buffer["final_info"]
         if isinstance(eval_buffer, dict):
             eval_buffer = DefaultTimeStep(**eval_buffer)
-        eval_buffer: DefaultTimeStep = jax.tree_map(lambda x: np.array(x), eval_buffer)
-        eval_episode_ends = eval_buffer.truncated | eval_buffer.terminated
-        eval_ep_rets = eval_buffer.ep_ret[eval_episode_ends].flatten()
-        eval_ep_lens = eval_buffer.ep_len[eval_episode_ends].flatten()
+        # only the episode statistics are needed, so only they are moved to the host and not e.g. the observations.
+        # For jax envs the episode end mask is computed on the device
+        eval_ep_rets, eval_ep_lens, eval_episode_ends = jax.device_get(
+            (eval_buffer.ep_ret, eval_buffer.ep_len, eval_buffer.truncated | eval_buffer.terminated)
+        )
+        eval_ep_rets = eval_ep_rets[eval_episode_ends].flatten()
+        eval_ep_lens = eval_ep_lens[eval_episode_ends].flatten()
         stats_list = []
         if not self.jax_env:
             for info in final_infos:
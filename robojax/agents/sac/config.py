@@ -9,15 +9,18 @@ import chex
 from flax import struct
 
 
-@dataclass
+@dataclass(frozen=True)
 class SACConfig:
     """
     Configuration dataclass for SAC
+
+    It is frozen and hashable so it can be passed as a static argument to jitted functions. Use `dataclasses.replace` to modify it
     """
 
     num_seed_steps: int
     """
-    Number of steps to take to seed the initial replay buffer. Will generate num_seed_steps of frames of data.
+    Number of steps to take to seed the initial replay buffer. Will generate num_seed_steps of frames of data, counted over all
+    num_envs parallel envs and rounded up to a multiple of steps_per_env * num_envs.
     """
 
     replay_buffer_capacity: int
@@ -72,6 +75,17 @@ class SACConfig:
     Frequency at which to update the target network
     """
 
+    scan_grad_updates: Optional[bool] = True
+    """
+    If True, the grad_updates_per_step batches of a training step are sampled at once and all gradient updates are run in a single
+    jitted jax.lax.scan. Otherwise each gradient update is dispatched separately
+    """
+    prefetch: Optional[bool] = True
+    """
+    If True and scan_grad_updates is False, the next batch of replay buffer data is sampled and moved to the device on a background thread
+    while the current gradient update runs
+    """
+
     eval_freq: Optional[int] = 20_000
     """
     Every eval_freq interactions an evaluation is performed
@@ -88,6 +102,7 @@ class SACConfig:
     log_freq: Optional[int] = 1000
     """
     Every log_freq interactions metrics (e.g. critic loss) are logged
+    and metrics since the last log are logged when training finishes. If log_freq <= 0, metrics are only logged when training finishes
     """
     save_freq: Optional[int] = 20_000
     """
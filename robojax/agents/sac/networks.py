@@ -4,7 +4,7 @@ Models for SAC
 import os
 from functools import partial
 from pathlib import Path
-from typing import Callable, Optional, Tuple
+from typing import Any, Callable, Optional, Tuple
 
 import flax
 import flax.linen as nn
@@ -24,18 +24,23 @@ tfb = tfp.bijectors
 
 class Critic(nn.Module):
     feature_extractor: nn.Module
+    dtype: Any = jnp.float32
+    """
+    dtype of the computation. Parameters are always kept in float32 and values are returned in float32
+    """
 
     @nn.compact
     def __call__(self, obs: Array, acts: Array) -> Array:
         x = jnp.concatenate([obs, acts], -1)
         features = self.feature_extractor(x)
-        value = nn.Dense(1)(features)
-        return jnp.squeeze(value, -1)
+        value = nn.Dense(1, dtype=self.dtype)(features)
+        return jnp.squeeze(value, -1).astype(jnp.float32)
 
 
 class DoubleCritic(nn.Module):
     feature_extractor: nn.Module
     num_critics: int = 2
+    dtype: Any = jnp.float32
 
     @nn.compact
     def __call__(self, obs: Array, acts: Array):
@@ -47,7 +52,7 @@ class DoubleCritic(nn.Module):
             out_axes=0,
             axis_size=self.num_critics,
         )
-        qs = VmapCritic(self.feature_extractor)(obs, acts)
+        qs = VmapCritic(self.feature_extractor, dtype=self.dtype)(obs, acts)
         return qs
 
 
@@ -65,32 +70,26 @@ class DiagGaussianActor(nn.Module):
     state_dependent_std: bool = True
     log_std_range: Tuple[float, float] = (-5.0, 2.0)
 
+    dtype: Any = jnp.float32
+    """
+    dtype of the computation. Parameters are always kept in float32 and the action distribution is always built in float32
+    """
+
     def setup(self) -> None:
         if self.state_dependent_std:
             # Add final dense layer initialization scale and orthogonal init
-            self.log_std = nn.Dense(self.act_dims, kernel_init=default_init(1))
+            self.log_std = nn.Dense(self.act_dims, kernel_init=default_init(1), dtype=self.dtype)
         else:
             self.log_std = self.param("log_std", nn.initializers.zeros, (self.act_dims,))
 
         # scale of orthgonal initialization is recommended to be (high - low) / 2.
         # We always assume envs use normalized actions [-1, 1] so we init with 1
-        self.action_head = nn.Dense(self.act_dims, kernel_init=default_init(1))
+        self.action_head = nn.Dense(self.act_dims, kernel_init=default_init(1), dtype=self.dtype)
 
     def __call__(self, x, deterministic=False):
-        x = self.feature_extractor(x)
-        a = self.action_head(x)
-        if not self.tanh_squash_distribution:
-            a = nn.tanh(a)
+        a, log_std = self._loc_log_std(x)
         if deterministic:
             return nn.tanh(a)
-        if self.state_dependent_std:
-            log_std = self.log_std(x)
-
-            # Spinning up implementaation
-            log_std = nn.tanh(log_std)
-            log_std = self.log_std_range[0] + 0.5 * (self.log_std_range[1] - self.log_std_range[0]) * (log_std + 1)
-        else:
-            log_std = self.log_std
         # log_std = jnp.clip(log_std, self.log_std_range[0], self.log_std_range[1])
         dist = tfd.MultivariateNormalDiag(a, jnp.exp(log_std))
         # distrax has some numerical imprecision bug atm where calling sample then log_prob can raise NaNs. tfd is more stable at the moment
@@ -100,6 +99,32 @@ class DiagGaussianActor(nn.Module):
             dist = tfd.TransformedDistribution(distribution=dist, bijector=tfb.Tanh())
         return dist
 
+    def sample_action(self, x, rng_key: PRNGKey):
+        """
+        Sample actions from the action distribution without building the distribution. Use __call__ instead if log
+        probabilities are needed
+        """
+        a, log_std = self._loc_log_std(x)
+        a = a + jnp.exp(log_std) * jax.random.normal(rng_key, a.shape)
+        if self.tanh_squash_distribution:
+            a = nn.tanh(a)
+        return a
+
+    def _loc_log_std(self, x):
+        x = self.feature_extractor(x)
+        a = self.action_head(x).astype(jnp.float32)
+        if not self.tanh_squash_distribution:
+            a = nn.tanh(a)
+        if self.state_dependent_std:
+            log_std = self.log_std(x).astype(jnp.float32)
+
+            # Spinning up implementaation
+            log_std = nn.tanh(log_std)
+            log_std = self.log_std_range[0] + 0.5 * (self.log_std_range[1] - self.log_std_range[0]) * (log_std + 1)
+        else:
+            log_std = self.log_std
+        return a, log_std
+
 
 class Temperature(nn.Module):
     initial_temperature: float = 1.0
@@ -156,6 +181,12 @@ class ActorCritic:
     def sample(self, rng_key: PRNGKey, actor: DiagGaussianActor, obs):
         return actor(obs).sample(seed=rng_key), {}
 
+    def sample_action(self, params: Params, obs, rng_key: PRNGKey):
+        """
+        Sample actions from the actor with the given params. Unlike sample, no action distribution is built
+        """
+        return self.actor.apply_fn(params, obs, rng_key, method=type(self.actor.model).sample_action)
+
     def state_dict(self):
         return dict(
             actor=self.actor.state_dict(),
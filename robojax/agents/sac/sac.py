@@ -1,11 +1,12 @@
 import os
 import pickle
 import time
-from collections import defaultdict
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
 from functools import partial
 from typing import Any, Callable, Tuple
 
-import distrax
 import flax
 import jax
 import jax.numpy as jnp
@@ -24,6 +25,17 @@ from robojax.logger import LoggerConfig
 from robojax.utils import tools
 
 
+REPLAY_STAGE_STEPS = 64
+"""
+Max number of timesteps (of num_envs interactions each) that are staged before being written to the replay buffer
+"""
+
+RNG_KEY_CHUNK_SIZE = 1024
+"""
+Number of training step PRNGKeys generated at once during training
+"""
+
+
 @struct.dataclass
 class TrainStepMetrics:
     train_stats: Any
@@ -71,7 +83,7 @@ class SAC(BasePolicy):
             self.cfg = SACConfig(**cfg)
         else:
             self.cfg = cfg
-        super().__init__(jax_env, env, eval_env, cfg.num_envs, cfg.num_eval_envs, logger_cfg)
+        super().__init__(jax_env, env, eval_env, self.cfg.num_envs, self.cfg.num_eval_envs, logger_cfg)
 
         self.state: SACTrainState = SACTrainState(
             ac=ac,
@@ -87,6 +99,13 @@ class SAC(BasePolicy):
             # TODO add a nice error message if this guessed sampler doesn't work
         self.seed_sampler = seed_sampler
 
+        # compile action sampling once as pure functions of the actor params, instead of tracing through the actor Model and self
+        def actor_sample(rng_key: PRNGKey, actor_params, env_obs):
+            return ac.sample_action(actor_params, env_obs, rng_key)
+
+        self._jit_actor_sample = jax.jit(actor_sample)
+        self._jit_seed_sampler = jax.jit(seed_sampler)
+
         buffer_config = dict(
             action=((self.action_dim,), self.action_space.dtype),
             reward=((), np.float32),
@@ -110,33 +129,67 @@ class SAC(BasePolicy):
             config=buffer_config,
         )
 
+        self._sample_executor = None
+        if self.cfg.prefetch and not self.cfg.scan_grad_updates:
+            self._sample_executor = ThreadPoolExecutor(max_workers=1)
+
+        # interactions are first written into a small staging buffer which is flushed into the replay buffer with one
+        # contiguous write when full or before the replay buffer is sampled from
+        self._stage = GenericBuffer(
+            buffer_size=min(REPLAY_STAGE_STEPS, self.replay_buffer.buffer_size_per_env) * self.cfg.num_envs,
+            num_envs=self.cfg.num_envs,
+            config=buffer_config,
+        )
+
+        # preallocated buffer for the per env bootstrap masks computed every env step
+        self._mask_buf = np.empty((self.cfg.num_envs,), dtype=np.float32)
+
+        # the parameter update used in training, compiled ahead of time when training starts or before the first update of a
+        # direct train_step call. See _compile_update
+        self._compiled_update = None
+
+        # metrics are written to the logger by a background thread once every log_freq interactions. The logger saves
+        # checkpoints upon metric improvements, which is deferred to the main thread and done before the logged train state
+        # changes. See _finish_logging
+        self._log_executor = ThreadPoolExecutor(max_workers=1)
+        self._log_future = None
+        self._pending_saves = deque()
+        if self.logger is not None and self.logger.save_fn is not None:
+            save_fn = self.logger.save_fn
+            self.logger.save_fn = lambda save_path: self._pending_saves.append((save_fn, save_path))
+
         if self.cfg.target_entropy is None:
-            self.cfg.target_entropy = -self.action_dim / 2
+            self.cfg = replace(self.cfg, target_entropy=-self.action_dim / 2)
 
         # Jax env specific code to improve speed
         if self.jax_env:
-            self._env_step = jax.jit(self._env_step, static_argnames=["seed"])
+            self._collect = jax.jit(self._collect, static_argnames=["seed"])
 
-    @partial(jax.jit, static_argnames=["self", "seed"])
     def _sample_action(self, rng_key, actor: DiagGaussianActor, env_obs, seed=False):
         if seed:
-            a = self.seed_sampler(rng_key)
+            a = self._jit_seed_sampler(rng_key)
         else:
-            dist: distrax.Distribution = actor(env_obs)
-            a = dist.sample(seed=rng_key)
+            a = self._jit_actor_sample(rng_key, actor.params, env_obs)
         return a, {}
 
     def _env_step(self, rng_key: PRNGKey, loop_state: EnvLoopState, actor: DiagGaussianActor, seed=False):
-        if self.jax_env:
-            rng_key, *env_rng_keys = jax.random.split(rng_key, self.cfg.num_envs + 1)
-            data, loop_state = self.loop.rollout(
-                jnp.stack(env_rng_keys), loop_state, actor, partial(self._sample_action, seed=seed), 1
-            )
-        else:
-            rng_key, env_rng_key = jax.random.split(rng_key, 2)
-            data, loop_state = self.loop.rollout([env_rng_key], loop_state, actor, partial(self._sample_action, seed=seed), 1)
+        data, loop_state = self.loop.rollout([rng_key], loop_state, actor, partial(self._sample_action, seed=seed), 1)
         return loop_state, data
 
+    def _collect(self, rng_key: PRNGKey, loop_state: EnvLoopState, actor: DiagGaussianActor, seed=False):
+        """
+        Rollout cfg.steps_per_env steps in each jax env and compute the bootstrap masks. Returned data and masks have shape
+        (steps_per_env, num_envs, ...) to match the layout of the replay buffer.
+        """
+        env_rng_keys = jax.random.split(rng_key, self.cfg.num_envs)
+        data, loop_state = self.loop.rollout(
+            env_rng_keys, loop_state, actor, partial(self._sample_action, seed=seed), self.cfg.steps_per_env
+        )
+        data: DefaultTimeStep = jax.tree_map(lambda x: jnp.swapaxes(x, 0, 1), data)
+        dones = data.terminated | data.truncated
+        masks = ((~dones) | data.truncated).astype(jnp.float32)
+        return loop_state, data, masks
+
     def train(self, rng_key: PRNGKey, steps: int, verbose=1):
         """
         Args :
@@ -160,15 +213,34 @@ class SAC(BasePolicy):
 
         start_step = self.state.total_env_steps
 
+        # compile the parameter update ahead of time so the first update does not wait on compilation
+        if self._compiled_update is None:
+            self._compiled_update = self._compile_update(self.state.ac)
+
         if verbose:
             pbar = tqdm(total=steps + self.state.total_env_steps, initial=start_step)
 
         env_rollout_size = self.cfg.steps_per_env * self.cfg.num_envs
+        # ring of the metrics of the training steps since the last time metrics were logged. If log_freq <= 0, metrics are
+        # only logged when training finishes
+        train_step_metrics_buffer = deque(
+            maxlen=4 * -(-self.cfg.log_freq // env_rollout_size) if self.cfg.log_freq > 0 else None
+        )
 
+        # the keys of training steps and evaluations are derived from self.state.rng_key and the number of training steps so far,
+        # so training resumed from a checkpoint or by another train() call continues the same random stream
+        train_rng_key, eval_rng_key = jax.random.split(self.state.rng_key, 2)
+        key_chunk_idx, train_rng_keys = None, None
         while self.state.total_env_steps < start_step + steps:
-            rng_key, train_rng_key = jax.random.split(self.state.rng_key, 2)
-            self.state, train_step_metrics = self.train_step(train_rng_key, self.state)
-            self.state = self.state.replace(rng_key=rng_key)
+            training_steps = self.state.training_steps
+            if training_steps // RNG_KEY_CHUNK_SIZE != key_chunk_idx:
+                # generate the keys of many training steps with one split and keep them on the host, where indexing them is free
+                key_chunk_idx = training_steps // RNG_KEY_CHUNK_SIZE
+                train_rng_keys = np.asarray(
+                    jax.random.split(jax.random.fold_in(train_rng_key, key_chunk_idx), RNG_KEY_CHUNK_SIZE)
+                )
+            self.state, train_step_metrics = self.train_step(train_rng_keys[training_steps % RNG_KEY_CHUNK_SIZE], self.state)
+            train_step_metrics_buffer.append(train_step_metrics)
 
             # evaluate the current trained actor periodically
             if (
@@ -176,52 +248,122 @@ class SAC(BasePolicy):
                 and tools.reached_freq(self.state.total_env_steps, self.cfg.eval_freq, step_size=env_rollout_size)
                 and self.state.total_env_steps > self.cfg.num_seed_steps
             ):
-                rng_key, eval_rng_key = jax.random.split(rng_key, 2)
                 eval_results = self.evaluate(
-                    eval_rng_key,
+                    jax.random.fold_in(eval_rng_key, self.state.training_steps),
                     num_envs=self.cfg.num_eval_envs,
                     steps_per_env=self.cfg.eval_steps,
                     eval_loop=self.eval_loop,
                     params=self.state.ac.actor,
                     apply_fn=self.state.ac.act,
                 )
-                self.logger.store(
-                    tag="test",
-                    ep_ret=eval_results["eval_ep_rets"],
-                    ep_len=eval_results["eval_ep_lens"],
-                )
-                self.logger.store(tag="test_stats", **eval_results["stats"])
-                self.logger.log(self.state.total_env_steps)
-                self.logger.reset()
-
-            # log training metrics
-
-            if verbose:
-                pbar.update(n=env_rollout_size)
-            self.logger.store(tag="train", **train_step_metrics.train)
-            self.logger.store(tag="train_stats", **train_step_metrics.train_stats)
-            # log time information
-            total_time = time.time() - train_start_time
-            if tools.reached_freq(self.state.total_env_steps, self.cfg.log_freq, step_size=env_rollout_size):
-                self.logger.store(tag="time", **train_step_metrics.time)
-                self.logger.store(
-                    tag="time",
-                    total=total_time,
-                    SPS=self.state.total_env_steps / total_time,
-                    total_env_steps=self.state.total_env_steps,
+                self._log_async(
+                    self.state.total_env_steps,
+                    test=dict(ep_ret=eval_results["eval_ep_rets"], ep_len=eval_results["eval_ep_lens"]),
+                    test_stats=eval_results["stats"],
                 )
 
-            # log and export the metrics
-            self.logger.log(self.state.total_env_steps)
-            self.logger.reset()
+            # log training and time metrics. The progress bar is updated at the same frequency to avoid its overhead every step
+            if tools.reached_freq(self.state.total_env_steps, self.cfg.log_freq, step_size=env_rollout_size):
+                if verbose:
+                    pbar.update(n=self.state.total_env_steps - pbar.n)
+                self._log_train_step_metrics(train_step_metrics_buffer, train_start_time)
 
             # save checkpoints. Note that the logger auto saves upon metric improvements
             if tools.reached_freq(self.state.total_env_steps, self.cfg.save_freq, env_rollout_size):
+                # the checkpoint includes the logger state, which must not be read while metrics are being logged
+                self._finish_logging()
                 self.save(
                     os.path.join(self.logger.model_path, f"ckpt_{self.state.total_env_steps}.jx"),
                     with_buffer=self.cfg.save_buffer_in_checkpoints,
                 )
 
+        if verbose:
+            pbar.update(n=self.state.total_env_steps - pbar.n)
+            pbar.close()
+
+        # log the metrics of the training steps since the last log and wait for them to be logged
+        if len(train_step_metrics_buffer) > 0:
+            self._log_train_step_metrics(train_step_metrics_buffer, train_start_time)
+        self._finish_logging()
+
+    def _log_train_step_metrics(self, train_step_metrics_buffer: deque, train_start_time: float):
+        """
+        Log the combined metrics of the buffered training steps along with time metrics, then clear the buffer
+        """
+        total_time = time.time() - train_start_time
+        train_metrics, train_stats = self._aggregate_train_step_metrics(train_step_metrics_buffer)
+        self._log_async(
+            self.state.total_env_steps,
+            train=train_metrics,
+            train_stats=train_stats,
+            time=dict(
+                **train_step_metrics_buffer[-1].time,
+                total=total_time,
+                SPS=self.state.total_env_steps / total_time,
+                total_env_steps=self.state.total_env_steps,
+            ),
+        )
+        train_step_metrics_buffer.clear()
+
+    def _log_async(self, step: int, **tagged_metrics):
+        """
+        Log the given metrics, a dict of metrics per tag, at the given step in the background logging thread.
+
+        Metrics are logged in the order this is called. Waits for the previously submitted metrics to be logged first, see
+        _finish_logging
+        """
+
+        def log():
+            for tag, metrics in tagged_metrics.items():
+                self.logger.store(tag=tag, **metrics)
+            self.logger.log(step)
+            self.logger.reset()
+
+        self._finish_logging()
+        self._log_future = self._log_executor.submit(log)
+
+    def _finish_logging(self):
+        """
+        Wait for the submitted metrics to be logged, re-raising any error that occurred while logging them, then save the
+        checkpoints the logger requested upon metric improvements.
+
+        This must be called before self.state changes after metrics are logged, so that these checkpoints hold the train
+        state the metrics were logged for, and before reading the logger state on the main thread
+        """
+        if self._log_future is not None:
+            self._log_future.result()
+            self._log_future = None
+        while self._pending_saves:
+            save_fn, save_path = self._pending_saves.popleft()
+            save_fn(save_path)
+
+    def _aggregate_train_step_metrics(self, train_step_metrics_buffer: deque):
+        """
+        Combine the metrics of the given training steps into the train and train_stats metrics to log.
+
+        Episode returns and lengths and custom stats are accumulated over all steps. Each update metric is taken from the latest
+        step that produced it (e.g. actor_loss is only produced on steps that update the actor) and moved to the host, which is
+        done here so that training steps never wait on the parameter updates to finish
+        """
+        train_metrics = dict(ep_ret=[], ep_len=[])
+        train_stats = defaultdict(list)
+        update_metrics = dict()
+        for train_step_metrics in train_step_metrics_buffer:
+            for k, v in train_step_metrics.train.items():
+                if k in train_metrics:
+                    if len(v) > 0:
+                        train_metrics[k].append(v)
+                else:
+                    update_metrics[k] = v
+            for k, v in train_step_metrics.train_stats.items():
+                train_stats[k] += v
+        for k in ["ep_ret", "ep_len"]:
+            if len(train_metrics[k]) > 0:
+                train_metrics[k] = np.concatenate(train_metrics[k])
+        for k, v in jax.device_get(update_metrics).items():
+            train_metrics[k] = float(v)
+        return train_metrics, train_stats
+
     def train_step(self, rng_key: PRNGKey, state: SACTrainState) -> Tuple[SACTrainState, TrainStepMetrics]:
         """
         Perform a single training step
@@ -243,47 +385,61 @@ class SAC(BasePolicy):
         train_metrics["ep_len"] = []
         time_metrics = dict()
 
+        # split all the keys needed for this training step at once. A jax env rollout takes a single key for all its steps
+        if self.jax_env:
+            update_rng_key, sample_key, env_rng_key = np.asarray(jax.random.split(rng_key, 3))
+        else:
+            rng_keys = np.asarray(jax.random.split(rng_key, self.cfg.steps_per_env + 2))
+            update_rng_key, sample_key, env_rng_keys = rng_keys[0], rng_keys[1], rng_keys[2:]
+
         # perform a rollout
-        # TODO make this buffer collection jittable
         rollout_time_start = time.time()
-        for _ in range(self.cfg.steps_per_env):
-            rng_key, env_rng_key = jax.random.split(rng_key, 2)
-            (next_loop_state, data) = self._env_step(
-                env_rng_key,
-                loop_state,
-                ac.actor,
-                seed=total_env_steps <= self.cfg.num_seed_steps,
-            )
-            if not self.jax_env:
-                final_infos = data[
-                    "final_info"
-                ]  # in gym loop this is just a list. in jax loop it should be a pytree with leaf shape (B, ) and a corresponding mask
-                del data["final_info"]
-                data = DefaultTimeStep(**data)
-            else:
-                final_infos = None  # TODO handle final infos in jax envs
-
-            # move data to numpy
-            data: DefaultTimeStep = jax.tree_map(lambda x: np.array(x)[:, 0], data)
-            terminations = data.terminated
-            truncations = data.truncated
-            dones = terminations | truncations
-            masks = ((~dones) | (truncations)).astype(float)
+        # num_seed_steps counts interactions summed over all num_envs envs, like total_env_steps
+        seed = total_env_steps < self.cfg.num_seed_steps
+        if self.jax_env:
+            # all steps_per_env steps are rolled out and their masks computed in one jitted call, requiring a single
+            # device to host transfer of the collected data
+            loop_state, data, masks = self._collect(env_rng_key, loop_state, ac.actor, seed=seed)
+            data, masks = jax.device_get((data, masks))
+            dones = data.terminated | data.truncated
             if dones.any():
-                # note for continuous task wrapped envs where there is no early done, all envs finish at the same time unless
-                # they are staggered. So masks is never false.
-                # if you want to always value bootstrap set masks to true.
                 train_metrics["ep_ret"].append(data.ep_ret[dones])
                 train_metrics["ep_len"].append(data.ep_len[dones])
-                if not self.jax_env:  # TODO fix for jax envs
+            self._stage_transitions(
+                self.cfg.steps_per_env,
+                env_obs=data.env_obs,
+                reward=data.reward,
+                action=data.action,
+                mask=masks,
+                next_env_obs=data.next_env_obs,
+            )
+        else:
+            for env_rng_key in env_rng_keys:
+                (next_loop_state, data) = self._env_step(env_rng_key, loop_state, ac.actor, seed=seed)
+                final_infos = data["final_info"]  # in gym loop this is just a list
+                del data["final_info"]
+                data = DefaultTimeStep(**data)
+
+                # move data to numpy with a single device to host transfer. Indexing the steps dimension only creates views
+                data: DefaultTimeStep = jax.tree_map(lambda x: x[:, 0], jax.device_get(data))
+                terminations = data.terminated.reshape(-1)
+                truncations = data.truncated.reshape(-1)
+                dones = terminations | truncations
+                masks = np.logical_or(~dones, truncations, out=self._mask_buf)
+                if dones.any():
+                    # note for continuous task wrapped envs where there is no early done, all envs finish at the same time unless
+                    # they are staggered. So masks is never false.
+                    # if you want to always value bootstrap set masks to true.
+                    train_metrics["ep_ret"].append(data.ep_ret[dones])
+                    train_metrics["ep_len"].append(data.ep_len[dones])
                     for final_info in final_infos:
                         if "stats" in final_info:
                             for k in final_info["stats"]:
                                 train_custom_stats[k].append(final_info["stats"][k])
-            self.replay_buffer.store(
-                env_obs=data.env_obs, reward=data.reward, action=data.action, mask=masks, next_env_obs=data.next_env_obs
-            )
-            loop_state = next_loop_state
+                self._stage_transitions(
+                    1, env_obs=data.env_obs, reward=data.reward, action=data.action, mask=masks, next_env_obs=data.next_env_obs
+                )
+                loop_state = next_loop_state
 
         # log time metrics
         rollout_time = time.time() - rollout_time_start
@@ -292,37 +448,51 @@ class SAC(BasePolicy):
         for k in train_metrics:
             if len(train_metrics[k]) > 0:
                 train_metrics[k] = np.concatenate(train_metrics[k]).flatten()
+        # the next parameter update donates the current train state which checkpoints requested by the logger may still need
+        self._finish_logging()
+
         # update policy
-        if self.state.total_env_steps >= self.cfg.num_seed_steps:
+        if total_env_steps >= self.cfg.num_seed_steps:
+            if self._compiled_update is None:
+                self._compiled_update = self._compile_update(ac)
+            self._flush_stage()
             update_time_start = time.time()
             update_actor = training_steps % self.cfg.actor_update_freq == 0
             update_target = training_steps % self.cfg.target_update_freq == 0
-            for _ in range(self.cfg.grad_updates_per_step):
-                rng_key, update_rng_key, sample_key = jax.random.split(rng_key, 3)
-                batch = self.replay_buffer.sample_random_batch(sample_key, self.cfg.batch_size)
-                batch = TimeStep(**batch)
-                ac, aux = self.update_parameters(
-                    update_rng_key,
-                    ac,
-                    batch,
-                    update_actor,
-                    update_target,
-                )
+            if self.cfg.scan_grad_updates:
+                batches = self._sample_batch(sample_key, num_batches=self.cfg.grad_updates_per_step)
+                ac, aux = self._compiled_update(update_rng_key, ac, batches, update_actor, update_target)
+            else:
+                update_rng_keys = np.asarray(jax.random.split(update_rng_key, self.cfg.grad_updates_per_step))
+                sample_keys = np.asarray(jax.random.split(sample_key, self.cfg.grad_updates_per_step))
+                if self.cfg.prefetch:
+                    next_batch = self._sample_executor.submit(self._sample_batch, sample_keys[0])
+                for i in range(self.cfg.grad_updates_per_step):
+                    if self.cfg.prefetch:
+                        batch = next_batch.result()
+                        # sample the next batch while the (asynchronously dispatched) update runs. No prefetch is left pending after the
+                        # last update as the replay buffer is written to again during the next rollout
+                        if i + 1 < self.cfg.grad_updates_per_step:
+                            next_batch = self._sample_executor.submit(self._sample_batch, sample_keys[i + 1])
+                    else:
+                        batch = self._sample_batch(sample_keys[i])
+                    ac, aux = self._compiled_update(update_rng_keys[i], ac, batch, update_actor, update_target)
             update_time = time.time() - update_time_start
             critic_update_aux: loss.CriticUpdateAux = aux["critic_update_aux"]
             actor_update_aux: loss.ActorUpdateAux = aux["actor_update_aux"]
             temp_update_aux: loss.TempUpdateAux = aux["temp_update_aux"]
 
-            train_metrics["critic_loss"] = float(critic_update_aux.critic_loss)
-            train_metrics["q1"] = float(critic_update_aux.q1)
-            train_metrics["q2"] = float(critic_update_aux.q2)
-            train_metrics["temp"] = float(temp_update_aux.temp)
+            # update metrics are kept on the device and only moved to the host when logged
+            train_metrics["critic_loss"] = critic_update_aux.critic_loss
+            train_metrics["q1"] = critic_update_aux.q1
+            train_metrics["q2"] = critic_update_aux.q2
+            train_metrics["temp"] = temp_update_aux.temp
             if update_actor:
-                train_metrics["actor_loss"] = float(actor_update_aux.actor_loss)
-                train_metrics["entropy"] = float(actor_update_aux.entropy)
-                train_metrics["target_entropy"] = float(self.cfg.target_entropy)
+                train_metrics["actor_loss"] = actor_update_aux.actor_loss
+                train_metrics["entropy"] = actor_update_aux.entropy
+                train_metrics["target_entropy"] = self.cfg.target_entropy
                 if self.cfg.learnable_temp:
-                    train_metrics["temp_loss"] = float(temp_update_aux.temp_loss)
+                    train_metrics["temp_loss"] = temp_update_aux.temp_loss
             time_metrics["update_time"] = update_time
 
         state = state.replace(
@@ -334,7 +504,88 @@ class SAC(BasePolicy):
 
         return state, TrainStepMetrics(time=time_metrics, train=train_metrics, train_stats=train_custom_stats)
 
-    @partial(jax.jit, static_argnames=["self", "update_actor", "update_target"])
+    def _stage_transitions(self, steps: int, **kwargs):
+        """
+        Store `steps` timesteps of interaction data, each value of shape (steps, num_envs, ...), into the staging buffer.
+        The staging buffer is flushed into the replay buffer once full
+        """
+        if self._stage.ptr + steps > self._stage.buffer_size_per_env:
+            self._flush_stage()
+        if steps >= self._stage.buffer_size_per_env:
+            # too large to stage, write directly to the replay buffer
+            self.replay_buffer.store_batch(**kwargs)
+            return
+        self._stage.store_batch(**kwargs)
+        if self._stage.full:
+            self._flush_stage()
+
+    def _flush_stage(self):
+        """
+        Move all staged interaction data into the replay buffer
+        """
+        size = self._stage.size()
+        if size == 0:
+            return
+        self.replay_buffer.store_batch(**jax.tree_util.tree_map(lambda x: x[:size], self._stage.buffers))
+        # only the pointer is reset as the staged data is overwritten anyway
+        self._stage.ptr, self._stage.full = 0, False
+
+    def _sample_batch(self, rng_key: PRNGKey, num_batches: int = None) -> TimeStep:
+        """
+        Sample a random batch from the replay buffer and move it to the device. If num_batches is given, that many batches are sampled
+        at once and stacked along a new first axis
+        """
+        if num_batches is None:
+            batch = self.replay_buffer.sample_random_batch(rng_key, self.cfg.batch_size)
+        else:
+            batch = self.replay_buffer.sample_random_batch(rng_key, num_batches * self.cfg.batch_size)
+            batch = jax.tree_util.tree_map(lambda x: x.reshape((num_batches, self.cfg.batch_size) + x.shape[1:]), batch)
+        batch = TimeStep(batch["action"], batch["env_obs"], batch["next_env_obs"], batch["reward"], batch["mask"])
+        # transfer the whole batch to the device at once instead of leaf by leaf when calling update_parameters
+        return jax.device_put(batch)
+
+    def _compile_update(self, ac: ActorCritic):
+        """
+        Compile ahead of time the parameter update used by train_step (update_parameters_scan if cfg.scan_grad_updates,
+        otherwise update_parameters) for the given actor critic and for batches of the replay buffer's shapes and dtypes.
+
+        The returned function is called without the static self and cfg arguments and raises an error instead of
+        recompiling if called with differently shaped or typed arguments
+        """
+        if self.cfg.scan_grad_updates:
+            update_fn, batch_shape = type(self).update_parameters_scan, (self.cfg.grad_updates_per_step, self.cfg.batch_size)
+        else:
+            update_fn, batch_shape = type(self).update_parameters, (self.cfg.batch_size,)
+        batch = jax.tree_util.tree_map(lambda x: np.zeros(batch_shape + x.shape[2:], x.dtype), self.replay_buffer.buffers)
+        batch = TimeStep(batch["action"], batch["env_obs"], batch["next_env_obs"], batch["reward"], batch["mask"])
+        return update_fn.lower(self, jax.random.PRNGKey(0), ac, jax.device_put(batch), True, True, self.cfg).compile()
+
+    @partial(jax.jit, static_argnames=["self", "cfg"], donate_argnums=(2,))
+    def update_parameters_scan(
+        self,
+        rng_key: PRNGKey,
+        ac: ActorCritic,
+        batches: TimeStep,
+        update_actor: bool,
+        update_target: bool,
+        cfg: SACConfig,
+    ) -> Tuple[ActorCritic, Any]:
+        """
+        Update actor critic parameters once for each batch in `batches` (stacked along the first axis) in a single jax.lax.scan.
+
+        Returns the updated actor critic and the auxiliary update data of the last update. As with update_parameters, the buffers of the
+        given `ac` are donated
+        """
+        num_batches = jax.tree_util.tree_leaves(batches)[0].shape[0]
+
+        def update_fn(ac: ActorCritic, data: Tuple[PRNGKey, TimeStep]):
+            rng_key, batch = data
+            return self.update_parameters(rng_key, ac, batch, update_actor, update_target, cfg)
+
+        ac, aux = jax.lax.scan(update_fn, ac, (jax.random.split(rng_key, num_batches), batches))
+        return ac, jax.tree_util.tree_map(lambda x: x[-1], aux)
+
+    @partial(jax.jit, static_argnames=["self", "cfg"], donate_argnums=(2,))
     def update_parameters(
         self,
         rng_key: PRNGKey,
@@ -342,30 +593,48 @@ class SAC(BasePolicy):
         batch: TimeStep,
         update_actor: bool,
         update_target: bool,
+        cfg: SACConfig,
     ) -> Tuple[ActorCritic, Any]:
         """
         Update actor critic parameters using the given batch
+
+        update_actor and update_target are traced booleans selecting the branches to run with jax.lax.cond, so a single compiled
+        function serves every combination of them. The hyperparameters are read from the static, hashable `cfg`, so they are compiled
+        in as constants and a different config results in a recompile rather than silently stale values.
+
+        The buffers of the given `ac` are donated and reused for the returned actor critic, so `ac` must not be used after this call
         """
-        rng_key, critic_update_rng_key = jax.random.split(rng_key, 2)
+        rng_key, critic_update_rng_key, actor_update_rng_key = jax.random.split(rng_key, 3)
         new_critic, critic_update_aux = loss.update_critic(
             critic_update_rng_key,
             ac,
             batch,
-            self.cfg.discount,
-            self.cfg.backup_entropy,
+            cfg.discount,
+            cfg.backup_entropy,
         )
-        # init dummy values
-        new_actor, actor_update_aux = ac.actor, loss.ActorUpdateAux()
-        new_temp, temp_update_aux = ac.temp, loss.TempUpdateAux(temp=ac.temp())
-        new_target = ac.target_critic
-
-        if update_target:
-            new_target = loss.update_target(ac.critic, ac.target_critic, self.cfg.tau)
-        if update_actor:
-            rng_key, actor_update_rng_key = jax.random.split(rng_key, 2)
+
+        new_target = jax.lax.cond(
+            update_target,
+            lambda: loss.update_target(ac.critic, ac.target_critic, cfg.tau),
+            lambda: ac.target_critic,
+        )
+
+        def actor_update():
             new_actor, actor_update_aux = loss.update_actor(actor_update_rng_key, ac, batch)
-            if self.cfg.learnable_temp:
-                new_temp, temp_update_aux = loss.update_temp(ac.temp, actor_update_aux.entropy, self.cfg.target_entropy)
+            new_temp, temp_update_aux = ac.temp, loss.TempUpdateAux(temp=ac.temp())
+            if cfg.learnable_temp:
+                new_temp, temp_update_aux = loss.update_temp(ac.temp, actor_update_aux.entropy, cfg.target_entropy)
+            return new_actor, actor_update_aux, new_temp, temp_update_aux
+
+        def no_actor_update():
+            # dummy values with the same structure as the outputs of actor_update
+            actor_update_aux = loss.ActorUpdateAux(actor_loss=jnp.zeros(()), entropy=jnp.zeros(()))
+            temp_update_aux = loss.TempUpdateAux(temp=ac.temp())
+            if cfg.learnable_temp:
+                temp_update_aux = temp_update_aux.replace(temp_loss=jnp.zeros(()))
+            return ac.actor, actor_update_aux, ac.temp, temp_update_aux
+
+        new_actor, actor_update_aux, new_temp, temp_update_aux = jax.lax.cond(update_actor, actor_update, no_actor_update)
         ac = ac.replace(actor=new_actor, critic=new_critic, target_critic=new_target, temp=new_temp)
         return (
             ac,
@@ -383,6 +652,7 @@ class SAC(BasePolicy):
             logger=self.logger.state_dict(),
         )
         if with_buffer:
+            self._flush_stage()
             state_dict["replay_buffer"] = self.replay_buffer
         return state_dict
 
@@ -405,6 +675,8 @@ class SAC(BasePolicy):
         ac = flax.serialization.from_bytes(self.state.ac, data["train_state"].ac)
         # use serialized ac model
         self.state: SACTrainState = data["train_state"].replace(ac=ac)
+        # drop interactions staged before loading, they do not belong to the loaded train state
+        self._stage.ptr, self._stage.full = 0, False
         # set initialized to False so previous env data is reset if it's not a jax env with env states we can start from
         if not self.jax_env:
             self.state = self.state.replace(initialized=False)
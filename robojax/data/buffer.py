@@ -111,25 +111,52 @@ class GenericBuffer(BaseBuffer):
         """
         for k in kwargs.keys():
             data = kwargs[k]
+            # assignment into the preallocated buffers already copies the data, reshaping only creates views
             if self.is_dict[k]:
                 for data_k in data.keys():
-                    d = np.array(data[data_k]).copy()
-                    d = d.reshape(self.buffers[k][data_k][self.ptr].shape)
-                    self.buffers[k][data_k][self.ptr] = d
+                    self.buffers[k][data_k][self.ptr] = np.reshape(data[data_k], self.buffers[k][data_k].shape[1:])
             else:
-                d = np.array(data).copy()
-                d = d.reshape(self.buffers[k][self.ptr].shape)
-                self.buffers[k][self.ptr] = d
+                self.buffers[k][self.ptr] = np.reshape(data, self.buffers[k].shape[1:])
         self.ptr += 1
         if self.ptr == self.buffer_size_per_env:
             # wrap pointer around to start replacing items
             self.full = True
             self.ptr = 0
 
-    # @partial(jax.jit, static_argnames=["self"])
-    def _get_batch_by_ids(self, buffers, batch_ids, env_ids):
+    def store_batch(self, **kwargs):
         """
-        statefully retrieve batch of data
+        store T timesteps of agent-environment interaction to the buffer, with each value being of shape (T, num_envs, ...).
+        Each buffer is written with at most two contiguous slice assignments. If full, replaces the oldest entries
+        """
+        batch_len = None
+        for k in kwargs.keys():
+            data = kwargs[k]
+            if self.is_dict[k]:
+                for data_k in data.keys():
+                    batch_len = self._store_slab(self.buffers[k][data_k], data[data_k])
+            else:
+                batch_len = self._store_slab(self.buffers[k], data)
+        if batch_len is None:
+            return
+        self.ptr += batch_len
+        if self.ptr >= self.buffer_size_per_env:
+            # wrap pointer around to start replacing items
+            self.full = True
+            self.ptr -= self.buffer_size_per_env
+
+    def _store_slab(self, buffer: np.ndarray, data) -> int:
+        data = np.reshape(data, (-1,) + buffer.shape[1:])
+        batch_len = len(data)
+        assert batch_len <= self.buffer_size_per_env, "Cannot store more timesteps at once than the buffer holds per env"
+        first = min(batch_len, self.buffer_size_per_env - self.ptr)
+        buffer[self.ptr : self.ptr + first] = data[:first]
+        if first < batch_len:
+            buffer[: batch_len - first] = data[first:]
+        return batch_len
+
+    def _get_batch_by_ids(self, buffers, ids):
+        """
+        retrieve batch of data via ids into the buffers flattened over their first two (time, env) dimensions
         """
         batch_data = dict()
         for k in buffers.keys():
@@ -137,9 +164,9 @@ class GenericBuffer(BaseBuffer):
             if self.is_dict[k]:
                 batch_data[k] = dict()
                 for data_k in data.keys():
-                    batch_data[k][data_k] = data[data_k][batch_ids, env_ids]
+                    batch_data[k][data_k] = _flatten_env_dim(data[data_k])[ids]
             else:
-                batch_data[k] = data[batch_ids, env_ids]
+                batch_data[k] = _flatten_env_dim(data)[ids]
         return batch_data
 
     def sample_random_batch(self, rng_key: PRNGKey, batch_size: int):
@@ -147,11 +174,15 @@ class GenericBuffer(BaseBuffer):
         Sample a batch of data with replacement
         """
         # TODO use rng_key
-        batch_ids = np.random.randint(self.size(), size=batch_size)
-        env_ids = np.random.randint(self.num_envs, size=batch_size)
-        # batch_ids, env_ids = sample_random_batch_env_ids(rng_key, batch_size, self.size(), self.num_envs)
-        # np.random.randint
-        return self._get_batch_by_ids(buffers=self.buffers, batch_ids=batch_ids, env_ids=env_ids)
+        # buffers are C-contiguous with shape (buffer_size_per_env, num_envs, ...), so the first size() * num_envs
+        # entries of the flattened buffers are exactly the filled ones and a single draw of ids covers both dimensions
+        ids = np.random.randint(self.size() * self.num_envs, size=batch_size)
+        return self._get_batch_by_ids(buffers=self.buffers, ids=ids)
+
+
+def _flatten_env_dim(x: np.ndarray) -> np.ndarray:
+    # reshaping a contiguous array returns a view, no data is copied
+    return x.reshape((-1,) + x.shape[2:])
 
 
 # Unused: is generally slower than numpy
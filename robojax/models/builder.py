@@ -5,6 +5,7 @@ from dataclasses import asdict
 from typing import Callable
 
 import flax.linen as nn
+import jax.numpy as jnp
 from dacite import from_dict
 
 from .mlp import MLP, MLPConfig
@@ -27,4 +28,5 @@ def build_network_from_cfg(cfg: NetworkConfig):
         cfg = from_dict(data_class=MLPConfig, data=asdict(cfg))
         cfg.arch_cfg.activation = activation_to_fn(cfg.arch_cfg.activation)
         cfg.arch_cfg.output_activation = activation_to_fn(cfg.arch_cfg.output_activation)
+        cfg.arch_cfg.dtype = jnp.dtype(cfg.arch_cfg.dtype)
         return MLP(**asdict(cfg.arch_cfg))
@@ -1,7 +1,7 @@
 """MLP class"""
 
 from dataclasses import dataclass
-from typing import Callable, List, Optional, Sequence, Union
+from typing import Any, Callable, List, Optional, Sequence, Union
 
 import flax.linen as nn
 import jax.numpy as jnp
@@ -15,6 +15,7 @@ class MLPArchConfig:
     activation: Union[Callable, str] = "relu"
     output_activation: Union[Callable, str] = None
     use_layer_norm: bool = False
+    dtype: str = "float32"
 
 
 @dataclass
@@ -36,6 +37,8 @@ class MLP(nn.Module):
     activation - internal activation
 
     output_activation - activation after final layer, default is None
+
+    dtype - dtype of the computation, e.g. bfloat16 for mixed precision. Parameters are always kept in float32
     """
 
     features: Sequence[int]
@@ -43,18 +46,19 @@ class MLP(nn.Module):
     output_activation: Callable[[jnp.ndarray], jnp.ndarray] = None
     final_ortho_scale: float = jnp.sqrt(2)
     use_layer_norm: bool = False
+    dtype: Any = jnp.float32
 
     @nn.compact
     def __call__(self, x):
         for feat in self.features[:-1]:
-            x = nn.Dense(feat, kernel_init=default_init())(x)
+            x = nn.Dense(feat, kernel_init=default_init(), dtype=self.dtype)(x)
             if self.use_layer_norm:
-                x = nn.LayerNorm()(x)
+                x = nn.LayerNorm(dtype=self.dtype)(x)
             x = self.activation(x)
-        x = nn.Dense(self.features[-1], kernel_init=default_init(self.final_ortho_scale))(x)
+        x = nn.Dense(self.features[-1], kernel_init=default_init(self.final_ortho_scale), dtype=self.dtype)(x)
         if self.output_activation is not None:
             if self.use_layer_norm:
-                x = nn.LayerNorm()(x)
+                x = nn.LayerNorm(dtype=self.dtype)(x)
             x = self.output_activation(x)
 
         return x
@@ -22,6 +22,10 @@ class EnvConfig:
     max_episode_steps: int
     num_envs: int
     env_kwargs: Dict
+    async_envs: bool = True
+    """
+    Whether non jax envs are run in parallel subprocesses. Set to False for cheap envs where the inter-process communication dominates
+    """
 
 
 @dataclass
@@ -43,6 +47,7 @@ def make_env_from_cfg(cfg: EnvConfig, seed: int = None, video_path: str = None):
         seed=seed,
         record_video_path=video_path,
         env_kwargs=cfg.env_kwargs,
+        async_envs=cfg.async_envs,
     )
 
 
@@ -55,9 +60,13 @@ def make_env(
     record_video_path: str = None,
     env_kwargs=dict(),
     wrappers=[],
+    async_envs: bool = True,
 ):
     """
     Utility function to create a jax/non-jax based environment given an env_id
+
+    For non-jax envs, if async_envs is True and num_envs > 1 the envs are stepped in parallel subprocesses which write observations into shared memory.
+    Otherwise they are stepped sequentially in the current process, which is faster for envs that are cheap to step.
     """
     if jax_env:
         import gymnax
@@ -115,22 +124,21 @@ def make_env(
         wrappers.append(lambda x: TimeLimit(x, max_episode_steps=max_episode_steps))
 
         # create a vector env parallelized across CPUs with the given timelimit and auto-reset
-        vector_env_cls = AsyncVectorEnv
-        if num_envs == 1:
-            vector_env_cls = SyncVectorEnv
-        env: VectorEnv = vector_env_cls(
-            [
-                env_factory(
-                    env_id,
-                    idx,
-                    seed=seed,
-                    env_kwargs=env_kwargs,
-                    record_video_path=record_video_path,
-                    wrappers=wrappers,
-                )
-                for idx in range(num_envs)
-            ]
-        )
+        env_fns = [
+            env_factory(
+                env_id,
+                idx,
+                seed=seed,
+                env_kwargs=env_kwargs,
+                record_video_path=record_video_path,
+                wrappers=wrappers,
+            )
+            for idx in range(num_envs)
+        ]
+        if async_envs and num_envs > 1:
+            env: VectorEnv = AsyncVectorEnv(env_fns, shared_memory=True)
+        else:
+            env: VectorEnv = SyncVectorEnv(env_fns)
         obs_space = env.single_observation_space
         act_space = env.single_action_space
         env.reset(seed=seed)
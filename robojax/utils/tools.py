@@ -4,7 +4,8 @@ from chex import Array
 
 
 def any_to_np(x: Array):
-    return np.array(x)
+    # np.asarray does not copy numpy inputs and transfers jax arrays to the host without an additional host side copy
+    return np.asarray(x)
 
 
 def is_jax_arr(x: Array):
@@ -17,7 +17,7 @@ from robojax.utils.spaces import get_action_dim
 
 warnings.simplefilter(action="ignore", category=FutureWarning)
 
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 
 
 @dataclass
@@ -62,8 +62,7 @@ def main(cfg: SACExperiment):
 
     video_path = osp.join(cfg.logger.workspace, cfg.logger.exp_name, "videos")
 
-    cfg.sac.num_envs = cfg.env.num_envs
-    cfg.sac.num_eval_envs = cfg.eval_env.num_envs
+    cfg.sac = replace(cfg.sac, num_envs=cfg.env.num_envs, num_eval_envs=cfg.eval_env.num_envs)
 
     # create envs
     env, env_meta = make_env_from_cfg(env_cfg, seed=cfg.seed)
@@ -91,10 +90,12 @@ def main(cfg: SACExperiment):
 
     # create actor and critics models
     act_dims = get_action_dim(env_meta.act_space)
+    actor_features = build_network_from_cfg(cfg.network.actor)
+    critic_features = build_network_from_cfg(cfg.network.critic)
     actor = DiagGaussianActor(
-        feature_extractor=build_network_from_cfg(cfg.network.actor), act_dims=act_dims, state_dependent_std=True
+        feature_extractor=actor_features, act_dims=act_dims, state_dependent_std=True, dtype=actor_features.dtype
     )
-    critic = DoubleCritic(feature_extractor=build_network_from_cfg(cfg.network.critic))
+    critic = DoubleCritic(feature_extractor=critic_features, dtype=critic_features.dtype)
     ac = ActorCritic.create(
         jax.random.PRNGKey(cfg.seed),
         actor=actor,